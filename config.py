@@ -6,13 +6,49 @@ filtros padrão e parametrizações.
 """
 import os
 from pathlib import Path
-from dotenv import load_dotenv
 
-# Carrega variáveis de ambiente do arquivo .env
-load_dotenv()
+# Indica se o arquivo .env já foi carregado neste processo
+_env_loaded = False
+
+
+def _load_env_once() -> None:
+    """
+    Carrega as variáveis de ambiente do arquivo .env na primeira chamada.
+    
+    O carregamento é adiado até a primeira leitura de uma configuração vinda
+    do ambiente, e pode ser desativado com PNS_SKIP_DOTENV=1.
+    """
+    global _env_loaded
+    
+    if _env_loaded:
+        return
+    _env_loaded = True
+    
+    if os.getenv("PNS_SKIP_DOTENV") != "1":
+        from dotenv import load_dotenv
+        load_dotenv()
+
+
+# --- Variáveis de ambiente ---
+# Configurações lidas do ambiente (.env), resolvidas sob demanda via __getattr__
+# Formato: {nome_da_constante: (variavel_de_ambiente, valor_padrao)}
+_ENV_SETTINGS = {
+    "BILLING_PROJECT_ID": ("BILLING_PROJECT_ID", None),
+    "LOG_LEVEL": ("LOG_LEVEL", "INFO"),
+}
+
+
+def __getattr__(name: str):
+    """Resolve as configurações de _ENV_SETTINGS, carregando o .env na primeira leitura."""
+    if name in _ENV_SETTINGS:
+        _load_env_once()
+        env_var, default = _ENV_SETTINGS[name]
+        return os.getenv(env_var, default)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # --- BigQuery / Base dos Dados ---
-BILLING_PROJECT_ID = os.getenv("BILLING_PROJECT_ID")
+# BILLING_PROJECT_ID: lido do ambiente (ver _ENV_SETTINGS)
 BIGQUERY_DATASET = "basedosdados.br_ms_pns"
 
 # Tabelas por origem (ano)
@@ -55,6 +91,6 @@ PNS_FILTERS = {
 }
 
 # --- Configurações de Log ---
-LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# LOG_LEVEL: lido do ambiente (ver _ENV_SETTINGS), padrão "INFO"
 
 
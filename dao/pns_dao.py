@@ -17,6 +17,7 @@ from dao.sqlite_client import (
     ensure_columns_exist,
     upsert_rows,
     get_connection,
+    get_reader,
     ensure_metadata_tables,
     upsert_metadata_variable,
     upsert_metadata_mapping
@@ -30,6 +31,14 @@ from mapping import VAR_MAP
 
 log = logging.getLogger(__name__)
 
+# Tipo do VAR_MAP -> dtype do pandas equivalente ao produzido pela limpeza,
+# usado para criar colunas com o mesmo tipo SQLite que o upsert inferiria
+_TIPO_DTYPES = {
+    "int": "Int64",
+    "float": "float64",
+    "string": "object",
+}
+
 
 class PNSDAO:
     """
@@ -80,8 +89,26 @@ class PNSDAO:
         
         # Garantir que todas as colunas necessárias existem na tabela
         # Inclui: variáveis solicitadas + PK + colunas de filtros
+        # Variáveis do VAR_MAP são criadas com o tipo declarado no mapeamento
+        # (via dtype, como no upsert); as demais usam a inferência por nome
+        from mapping import get_tipo
+        
         required_columns = set(semantic_variables) | set(PRIMARY_KEY_COLUMNS) | filter_columns
-        ensure_columns_exist(list(required_columns))
+        typed_columns = {}
+        untyped_columns = []
+        for col in required_columns:
+            tipo = next(
+                (get_tipo(col, source) for source in sources if get_tipo(col, source)),
+                None
+            )
+            if tipo in _TIPO_DTYPES:
+                typed_columns[col] = pd.Series(dtype=_TIPO_DTYPES[tipo])
+            else:
+                untyped_columns.append(col)
+        
+        ensure_columns_exist(pd.DataFrame(typed_columns))
+        if untyped_columns:
+            ensure_columns_exist(untyped_columns)
         
         # Para cada origem, verificar se precisa buscar dados
         # Usar todas as colunas necessárias (variáveis + filtros) para garantir que os dados estejam completos
@@ -139,7 +166,7 @@ class PNSDAO:
             True se precisa buscar dados, False caso contrário
         """
         # Verificar se há registros para esta origem
-        with get_connection() as conn:
+        with get_reader() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 f"SELECT COUNT(*) FROM {PNS_TABLE_NAME} WHERE origem = ?",
@@ -178,7 +205,7 @@ class PNSDAO:
         # Verificar se as colunas físicas têm dados não-nulos para esta origem
         # Se uma coluna foi criada mas nunca populada, ela terá todos os valores NULL
         if physical_variables:
-            with get_connection() as conn:
+            with get_reader() as conn:
                 cursor = conn.cursor()
                 for var in physical_variables:
                     # Verificar se há pelo menos um valor não-nulo para esta variável e origem
@@ -261,7 +288,7 @@ class PNSDAO:
                 return
             
             # 5. Garantir que todas as colunas existem no SQLite
-            ensure_columns_exist(df_clean.columns.tolist())
+            ensure_columns_exist(df_clean)
             
             # 6. Salvar no SQLite
             log.info(f"Salvando {len(df_clean)} registros no SQLite...")
@@ -325,7 +352,7 @@ class PNSDAO:
         """
         
         # Executar query
-        with get_connection() as conn:
+        with get_reader() as conn:
             df = pd.read_sql_query(query, conn)
         
         log.info(f"Carregados {len(df)} registros do repositório local")
@@ -585,7 +612,7 @@ class PNSDAO:
             
             # Persistir no SQLite
             # Garantir que a coluna existe
-            ensure_columns_exist([derived_var_name])
+            ensure_columns_exist(df[[derived_var_name]])
             
             # Preparar DataFrame para upsert (apenas PK + variável derivada)
             df_to_save = df[PRIMARY_KEY_COLUMNS + [derived_var_name]].copy()
@@ -12,55 +12,304 @@ não como cache temporário.
 import sqlite3
 import logging
 import json
+import re
+import threading
+from datetime import datetime, timezone
 from pathlib import Path
 from contextlib import contextmanager
-from typing import Optional, List, Dict, Any
-import pandas as pd
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional, List, Dict, Any, Tuple, Union
 
 from config import SQLITE_PATH, PNS_TABLE_NAME, PRIMARY_KEY_COLUMNS
 
+# pandas é importado sob demanda nas funções que o usam, para não pesar
+# no import de quem só precisa das operações de schema
+if TYPE_CHECKING:
+    import pandas as pd
+
 # Configurar logger
 log = logging.getLogger(__name__)
 
+# PRAGMAs persistentes no arquivo do banco (aplicados apenas na primeira conexão)
+# auto_vacuum só tem efeito em banco novo e precisa vir antes do journal_mode,
+# que já grava o cabeçalho do arquivo
+_DATABASE_PRAGMAS = """
+    PRAGMA auto_vacuum=INCREMENTAL;
+    PRAGMA journal_mode=WAL;
+"""
+
+# PRAGMAs que valem apenas para a conexão atual (aplicados em toda conexão)
+_CONNECTION_PRAGMAS = """
+    PRAGMA synchronous=NORMAL;
+    PRAGMA mmap_size=268435456;
+    PRAGMA cache_size=-20000;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA busy_timeout=5000;
+    PRAGMA journal_size_limit=67108864;
+"""
+
+# Nomes de tabela aceitos (identificadores SQL simples)
+_SAFE_IDENT = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# Indica se os PRAGMAs do banco já foram aplicados neste processo
+_initialized = False
+
+
+def _apply_pragmas(conn: sqlite3.Connection, read_only: bool = False) -> None:
+    """
+    Aplica os PRAGMAs de desempenho na conexão.
+    
+    journal_mode=WAL permite leituras concorrentes com escritas e
+    synchronous=NORMAL reduz os fsyncs por transação. Os PRAGMAs
+    persistentes são aplicados apenas na primeira conexão de escrita do processo.
+    
+    Args:
+        conn: Conexão recém-aberta com o banco
+        read_only: Se True, aplica apenas os PRAGMAs da conexão
+    """
+    global _initialized
+    
+    if not _initialized and not read_only:
+        conn.executescript(_DATABASE_PRAGMAS)
+        _initialized = True
+    
+    conn.executescript(_CONNECTION_PRAGMAS)
+
+
+def _validate_table_name(table_name: str) -> None:
+    """
+    Valida o nome de uma tabela contra a allowlist de identificadores.
+    
+    Args:
+        table_name: Nome da tabela
+    
+    Raises:
+        ValueError: Se o nome não for um identificador SQL simples
+                    (letras, dígitos e underscore, sem começar por dígito)
+    """
+    if not _SAFE_IDENT.match(table_name):
+        raise ValueError(f"Nome de tabela inválido: {table_name!r}")
+
+
+def _quote_identifier(name: str) -> str:
+    """
+    Escapa um identificador SQL (tabela ou coluna) para uso seguro em f-strings.
+    
+    Envolve o nome em aspas duplas e duplica as aspas internas, de modo que
+    nomes vindos de DataFrames não possam injetar SQL.
+    
+    Args:
+        name: Nome da tabela ou coluna
+    
+    Returns:
+        Identificador entre aspas duplas
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+
+# Mapeamento de dtype do pandas (dtype.kind) para tipo SQLite
+_DTYPE_KIND_MAP = {
+    'i': 'INTEGER',
+    'u': 'INTEGER',
+    'b': 'INTEGER',
+    'f': 'REAL',
+    'M': 'DATETIME',
+}
+
+# Cache de colunas por tabela: {tabela: (schema_version, colunas)}
+_cols_cache: Dict[str, Tuple[int, List[str]]] = {}
+
+# Conexões reutilizadas (uma de escrita e uma de leitura por thread),
+# mantendo os arquivos WAL/shm abertos
+_local = threading.local()
+
+
+def _get_writer_connection() -> sqlite3.Connection:
+    """
+    Retorna a conexão de escrita da thread atual, abrindo-a na primeira chamada.
+    
+    Returns:
+        sqlite3.Connection: Conexão reutilizável com o banco de dados
+    """
+    conn = getattr(_local, "writer", None)
+    if conn is None:
+        # Garantir que o diretório existe
+        SQLITE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        
+        conn = sqlite3.connect(str(SQLITE_PATH))
+        conn.row_factory = sqlite3.Row  # Permite acesso por nome de coluna
+        _apply_pragmas(conn)
+        _local.writer = conn
+    return conn
+
+
+def _get_reader_connection() -> sqlite3.Connection:
+    """
+    Retorna a conexão somente leitura da thread atual, abrindo-a na primeira chamada.
+    
+    Returns:
+        sqlite3.Connection: Conexão somente leitura com o banco de dados
+    """
+    conn = getattr(_local, "reader", None)
+    if conn is None:
+        # A conexão de escrita cria o arquivo e ativa o WAL antes da leitura
+        _get_writer_connection()
+        
+        conn = sqlite3.connect(f"{SQLITE_PATH.as_uri()}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row  # Permite acesso por nome de coluna
+        _apply_pragmas(conn, read_only=True)
+        _local.reader = conn
+    return conn
+
+
 @contextmanager
 def get_connection():
     """
     Context manager para conexão SQLite.
     
-    Garante que a conexão seja fechada corretamente e cria o diretório
-    do banco se não existir.
+    Reutiliza a conexão de escrita da thread atual (criando o diretório do
+    banco se não existir) e faz commit ao final do bloco ou rollback em caso
+    de erro. A conexão não é fechada; use close_connection() para encerrá-la.
     
     Yields:
         sqlite3.Connection: Conexão com o banco de dados
     """
-    # Garantir que o diretório existe
-    SQLITE_PATH.parent.mkdir(parents=True, exist_ok=True)
-    
-    conn = sqlite3.connect(str(SQLITE_PATH))
-    conn.row_factory = sqlite3.Row  # Permite acesso por nome de coluna
+    conn = _get_writer_connection()
     
     try:
         yield conn
         conn.commit()
     except Exception as e:
         conn.rollback()
+        # O rollback desfaz DDL e volta o schema_version; descartar o cache
+        _cols_cache.clear()
         log.error(f"Erro na transação SQLite: {e}")
         raise
-    finally:
-        conn.close()
 
 
-def table_exists(table_name: str = PNS_TABLE_NAME) -> bool:
+@contextmanager
+def get_writer():
+    """
+    Context manager para a conexão de escrita.
+    
+    Igual a get_connection(), mas abre a transação com BEGIN IMMEDIATE,
+    reservando o lock de escrita no início e evitando SQLITE_BUSY no meio
+    da transação.
+    
+    Yields:
+        sqlite3.Connection: Conexão de escrita com transação aberta
+    """
+    with get_connection() as conn:
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        yield conn
+
+
+@contextmanager
+def get_reader():
+    """
+    Context manager para a conexão somente leitura.
+    
+    Em modo WAL, leituras por esta conexão não bloqueiam nem são bloqueadas
+    pela conexão de escrita. Enxerga apenas dados já commitados.
+    
+    Yields:
+        sqlite3.Connection: Conexão somente leitura com o banco de dados
+    """
+    yield _get_reader_connection()
+
+
+@contextmanager
+def _use_connection(
+    conn: Optional[sqlite3.Connection] = None,
+    immediate: bool = False
+):
+    """
+    Usa a conexão recebida ou abre um bloco próprio com get_connection().
+    
+    Quando `conn` é fornecida, a transação pertence a quem chamou: nada é
+    commitado aqui, permitindo agrupar várias operações em uma só transação.
+    
+    Args:
+        conn: Conexão obtida de get_connection() (opcional)
+        immediate: Se True, abre a transação com BEGIN IMMEDIATE (escrita)
+    
+    Yields:
+        sqlite3.Connection: Conexão a ser usada na operação
+    """
+    if conn is not None:
+        if immediate and not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        yield conn
+        return
+    
+    with (get_writer() if immediate else get_connection()) as new_conn:
+        yield new_conn
+
+
+def close_connection() -> None:
+    """
+    Fecha as conexões SQLite (escrita e leitura) da thread atual, se houver.
+    
+    Deve ser chamada ao encerrar o uso do banco (ou antes de apagar o
+    arquivo), já que as conexões são mantidas abertas entre chamadas.
+    """
+    global _initialized
+    
+    for attr in ("reader", "writer"):
+        conn = getattr(_local, attr, None)
+        if conn is not None:
+            conn.close()
+            setattr(_local, attr, None)
+    
+    # Um novo arquivo de banco pode repetir o mesmo schema_version
+    _cols_cache.clear()
+    
+    # A próxima conexão pode abrir um banco novo, que precisa receber
+    # novamente os PRAGMAs persistentes (auto_vacuum, journal_mode)
+    _initialized = False
+
+
+def maintenance(pages: int = 10000) -> None:
+    """
+    Executa a manutenção periódica do banco.
+    
+    Devolve ao disco até `pages` páginas livres (requer auto_vacuum=INCREMENTAL,
+    definido na criação do banco) e faz checkpoint do WAL, truncando o arquivo.
+    
+    Args:
+        pages: Número máximo de páginas livres a liberar (padrão: 10.000)
+    """
+    conn = _get_writer_connection()
+    
+    # executescript faz commit da transação pendente e executa o PRAGMA até o
+    # fim (com execute(), apenas uma página seria liberada por chamada); o
+    # checkpoint também precisa rodar fora de uma transação
+    conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+    busy, wal_pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    log.info(
+        f"Manutenção do SQLite concluída (checkpoint: {checkpointed}/{wal_pages} páginas"
+        f"{', banco ocupado' if busy else ''})"
+    )
+
+
+def table_exists(
+    table_name: str = PNS_TABLE_NAME,
+    conn: Optional[sqlite3.Connection] = None
+) -> bool:
     """
     Verifica se uma tabela existe no banco de dados.
     
     Args:
         table_name: Nome da tabela (padrão: PNS_TABLE_NAME)
+        conn: Conexão a reutilizar na transação de quem chamou (opcional)
     
     Returns:
         True se a tabela existe, False caso contrário
     """
-    with get_connection() as conn:
+    _validate_table_name(table_name)
+    
+    with _use_connection(conn) as conn:
         cursor = conn.cursor()
         cursor.execute("""
             SELECT name FROM sqlite_master 
@@ -69,24 +318,48 @@ def table_exists(table_name: str = PNS_TABLE_NAME) -> bool:
         return cursor.fetchone() is not None
 
 
-def get_table_columns(table_name: str = PNS_TABLE_NAME) -> List[str]:
+def get_table_columns(
+    table_name: str = PNS_TABLE_NAME,
+    conn: Optional[sqlite3.Connection] = None
+) -> List[str]:
     """
     Retorna lista de colunas existentes em uma tabela.
     
+    O resultado é mantido em cache e só é recalculado quando o
+    PRAGMA schema_version do banco muda (qualquer DDL o incrementa).
+    Sem `conn`, a consulta usa a conexão somente leitura (schema já commitado).
+    
     Args:
         table_name: Nome da tabela (padrão: PNS_TABLE_NAME)
+        conn: Conexão a reutilizar na transação de quem chamou (opcional)
     
     Returns:
         Lista de nomes de colunas
     """
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = [row[1] for row in cursor.fetchall()]
-        return columns
+    _validate_table_name(table_name)
+    
+    if conn is None:
+        conn = _get_reader_connection()
+    
+    cursor = conn.cursor()
+    schema_version = cursor.execute("PRAGMA schema_version").fetchone()[0]
+    
+    cached = _cols_cache.get(table_name)
+    if cached is not None and cached[0] == schema_version:
+        return list(cached[1])
+    
+    columns = [
+        row[1]
+        for row in cursor.execute(f"PRAGMA table_info({_quote_identifier(table_name)})")
+    ]
+    _cols_cache[table_name] = (schema_version, columns)
+    return list(columns)
 
 
-def ensure_table_exists(table_name: str = PNS_TABLE_NAME) -> None:
+def ensure_table_exists(
+    table_name: str = PNS_TABLE_NAME,
+    conn: Optional[sqlite3.Connection] = None
+) -> None:
     """
     Cria a tabela principal se ela não existir.
     
@@ -95,27 +368,40 @@ def ensure_table_exists(table_name: str = PNS_TABLE_NAME) -> None:
       Esta PK identifica unicamente cada morador (indivíduo) na pesquisa
     - Colunas de controle: created_at, updated_at
     - Sem colunas de dados semânticos (serão adicionadas dinamicamente)
+    - WITHOUT ROWID: a PK é a própria chave de agrupamento da B-tree, evitando
+      manter um índice de PK separado da tabela a cada upsert
+    
+    O SQLite não permite alterar uma tabela existente para WITHOUT ROWID.
+    Bancos criados antes desta mudança continuam funcionando; para migrar,
+    apague o arquivo do banco (os dados são buscados novamente do BigQuery) ou
+    recrie a tabela com CREATE TABLE ... WITHOUT ROWID, INSERT ... SELECT,
+    DROP TABLE e ALTER TABLE ... RENAME TO.
     
     Args:
         table_name: Nome da tabela (padrão: PNS_TABLE_NAME)
+        conn: Conexão a reutilizar na transação de quem chamou (opcional)
     """
-    if table_exists(table_name):
+    _validate_table_name(table_name)
+    
+    if table_exists(table_name, conn=conn):
         log.debug(f"Tabela {table_name} já existe")
         return
     
     # Construir definições de colunas da PK
-    pk_columns_def = ", ".join([f"{col} TEXT NOT NULL" for col in PRIMARY_KEY_COLUMNS])
-    pk_constraint = ", ".join(PRIMARY_KEY_COLUMNS)
+    pk_columns_def = ", ".join(
+        [f"{_quote_identifier(col)} TEXT NOT NULL" for col in PRIMARY_KEY_COLUMNS]
+    )
+    pk_constraint = ", ".join(_quote_identifier(col) for col in PRIMARY_KEY_COLUMNS)
     
-    with get_connection() as conn:
+    with _use_connection(conn) as conn:
         cursor = conn.cursor()
         cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS {table_name} (
+            CREATE TABLE IF NOT EXISTS {_quote_identifier(table_name)} (
                 {pk_columns_def},
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                 updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                 PRIMARY KEY ({pk_constraint})
-            )
+            ) WITHOUT ROWID
         """)
         log.info(f"Tabela {table_name} criada com sucesso")
 
@@ -123,7 +409,8 @@ def ensure_table_exists(table_name: str = PNS_TABLE_NAME) -> None:
 def add_column_if_not_exists(
     column_name: str,
     column_type: str,
-    table_name: str = PNS_TABLE_NAME
+    table_name: str = PNS_TABLE_NAME,
+    conn: Optional[sqlite3.Connection] = None
 ) -> None:
     """
     Adiciona uma coluna à tabela se ela não existir.
@@ -134,92 +421,242 @@ def add_column_if_not_exists(
         column_name: Nome da coluna a ser adicionada
         column_type: Tipo SQLite (TEXT, INTEGER, REAL, etc.)
         table_name: Nome da tabela (padrão: PNS_TABLE_NAME)
+        conn: Conexão a reutilizar na transação de quem chamou (opcional)
     """
+    _validate_table_name(table_name)
+    
     # Garantir que a tabela existe antes de consultar suas colunas
-    ensure_table_exists(table_name)
+    ensure_table_exists(table_name, conn=conn)
     
-    existing_columns = get_table_columns(table_name)
+    existing_columns = get_table_columns(table_name, conn=conn)
     
     if column_name in existing_columns:
         log.debug(f"Coluna {column_name} já existe em {table_name}")
         return
     
-    with get_connection() as conn:
+    with _use_connection(conn) as conn:
         cursor = conn.cursor()
         # SQLite não suporta IF NOT EXISTS em ALTER TABLE, por isso verificamos antes
         cursor.execute(f"""
-            ALTER TABLE {table_name}
-            ADD COLUMN {column_name} {column_type}
+            ALTER TABLE {_quote_identifier(table_name)}
+            ADD COLUMN {_quote_identifier(column_name)} {column_type}
         """)
+        _cols_cache.pop(table_name, None)
         log.info(f"Coluna {column_name} ({column_type}) adicionada à tabela {table_name}")
 
 
+def _infer_column_type(col_name: str, dtype: Optional[Any] = None) -> str:
+    """
+    Infere o tipo SQLite de uma coluna.
+    
+    Se o dtype do pandas for conhecido, o tipo é derivado dele; caso contrário,
+    usa convenções de nome da coluna, com TEXT como padrão.
+    
+    Args:
+        col_name: Nome da coluna
+        dtype: dtype do pandas da coluna (opcional)
+    
+    Returns:
+        Tipo SQLite (TEXT, INTEGER, REAL ou DATETIME)
+    """
+    if dtype is not None:
+        return _DTYPE_KIND_MAP.get(dtype.kind, 'TEXT')
+    
+    # Tipos padrão baseados em convenções de nome
+    if col_name.endswith('_at'):
+        return 'DATETIME'
+    elif any(keyword in col_name.lower() for keyword in ['idade', 'anos', 'filhos', 'count']):
+        return 'INTEGER'
+    elif any(keyword in col_name.lower() for keyword in ['peso', 'renda', 'per_capita']):
+        return 'REAL'
+    return 'TEXT'
+
+
 def ensure_columns_exist(
-    column_names: List[str],
-    table_name: str = PNS_TABLE_NAME
+    df_or_cols: Union['pd.DataFrame', List[str]],
+    table_name: str = PNS_TABLE_NAME,
+    conn: Optional[sqlite3.Connection] = None
 ) -> None:
     """
     Garante que múltiplas colunas existam na tabela.
     
-    Para cada coluna, infere o tipo apropriado baseado no nome ou usa TEXT como padrão.
+    Se um DataFrame for passado, o tipo de cada coluna é inferido a partir do
+    seu dtype (int -> INTEGER, float -> REAL, datetime -> DATETIME, demais -> TEXT).
+    Para uma lista de nomes, infere o tipo baseado no nome ou usa TEXT como padrão.
+    As colunas faltantes são adicionadas em uma única transação (BEGIN IMMEDIATE).
     Esta função é útil quando se recebe um DataFrame e precisa garantir que
     todas as colunas existam antes de fazer upsert.
     
     Args:
-        column_names: Lista de nomes de colunas
+        df_or_cols: DataFrame com os dados ou lista de nomes de colunas
         table_name: Nome da tabela (padrão: PNS_TABLE_NAME)
+        conn: Conexão a reutilizar na transação de quem chamou (opcional)
     """
+    _validate_table_name(table_name)
+    
+    if hasattr(df_or_cols, 'dtypes'):
+        dtypes = df_or_cols.dtypes.to_dict()
+    else:
+        dtypes = dict.fromkeys(df_or_cols)
+    
     # Garantir que a tabela existe antes de consultar suas colunas
-    ensure_table_exists(table_name)
+    ensure_table_exists(table_name, conn=conn)
     
-    existing_columns = get_table_columns(table_name)
+    existing_columns = set(get_table_columns(table_name, conn=conn))
     
-    for col_name in column_names:
-        if col_name in existing_columns:
-            continue
-        
-        # Inferir tipo baseado no nome da coluna
-        # Colunas de PK e controle já existem, então não precisamos tratá-las aqui
-        if col_name in PRIMARY_KEY_COLUMNS or col_name in ['created_at', 'updated_at']:
-            continue
+    # Colunas de PK e controle já existem, então não precisamos tratá-las aqui
+    reserved_columns = set(PRIMARY_KEY_COLUMNS) | {'created_at', 'updated_at'}
+    missing_columns = [
+        col for col in dtypes
+        if col not in existing_columns and col not in reserved_columns
+    ]
+    
+    if not missing_columns:
+        return
+    
+    # Adicionar todas as colunas faltantes em uma única transação
+    with _use_connection(conn, immediate=True) as conn:
+        cursor = conn.cursor()
         
-        # Tipos padrão baseados em convenções de nome
-        if col_name.endswith('_at') or col_name in ['created_at', 'updated_at']:
-            col_type = 'DATETIME'
-        elif any(keyword in col_name.lower() for keyword in ['idade', 'anos', 'filhos', 'count']):
-            col_type = 'INTEGER'
-        elif any(keyword in col_name.lower() for keyword in ['peso', 'renda', 'per_capita']):
-            col_type = 'REAL'
-        else:
-            col_type = 'TEXT'
+        for col_name in missing_columns:
+            col_type = _infer_column_type(col_name, dtypes[col_name])
+            
+            cursor.execute(f"""
+                ALTER TABLE {_quote_identifier(table_name)}
+                ADD COLUMN {_quote_identifier(col_name)} {col_type}
+            """)
+            log.info(f"Coluna {col_name} ({col_type}) adicionada à tabela {table_name}")
+
+
+@lru_cache(maxsize=64)
+def _build_upsert_sql(
+    table_name: str,
+    columns: Tuple[str, ...],
+    pk_columns: Tuple[str, ...]
+) -> Tuple[str, str, str, str]:
+    """
+    Monta os comandos SQL do upsert para uma assinatura (tabela, colunas, PK).
+    
+    O resultado é mantido em cache, de modo que chamadas repetidas com as mesmas
+    colunas reutilizam exatamente as mesmas strings SQL (e, com isso, o cache
+    de prepared statements da conexão).
+    
+    Args:
+        table_name: Nome da tabela de destino
+        columns: Colunas a inserir (sem created_at/updated_at)
+        pk_columns: Colunas que formam a chave primária
+    
+    Returns:
+        Tupla (create_stage, insert_stage, merge, drop_stage) com os comandos SQL.
+        O comando de merge recebe o parâmetro nomeado :now (created_at/updated_at)
+    """
+    # Construir query com ON CONFLICT DO UPDATE (ou DO NOTHING)
+    # SQLite 3.24+ suporta esta sintaxe
+    # Todos os identificadores são escapados com aspas duplas
+    table = _quote_identifier(table_name)
+    quoted_columns = [_quote_identifier(col) for col in columns]
+    
+    placeholders = ', '.join(['?' for _ in columns])
+    columns_str = ', '.join(quoted_columns)
+    
+    # Colunas para atualizar (todas exceto PK, created_at e updated_at)
+    # created_at nunca é atualizado (preserva o valor original)
+    # updated_at é atualizado para o timestamp do lote (:now)
+    # COALESCE preserva valores existentes quando o DataFrame traz NULL
+    update_columns = [
+        quoted for col, quoted in zip(columns, quoted_columns)
+        if col not in pk_columns
+    ]
+    
+    pk_constraint = ", ".join(_quote_identifier(col) for col in pk_columns)
+    
+    if update_columns:
+        update_parts = [
+            f'{col} = COALESCE(excluded.{col}, {table}.{col})'
+            for col in update_columns
+        ]
+        update_parts.append('updated_at = :now')
+        update_set = ', '.join(update_parts)
         
-        add_column_if_not_exists(col_name, col_type, table_name)
+        # Linhas cujo conteúdo não muda são ignoradas (sem escrita e sem
+        # alterar updated_at), tornando reingestões idênticas um no-op.
+        # Uma única comparação de row values (em vez de uma cadeia de OR)
+        # mantém a árvore de expressão rasa mesmo com milhares de colunas
+        new_values = ', '.join(
+            f'COALESCE(excluded.{col}, {table}.{col})' for col in update_columns
+        )
+        old_values = ', '.join(f'{table}.{col}' for col in update_columns)
+        changed_condition = f'({new_values}) IS NOT ({old_values})'
+        conflict_clause = f"""DO UPDATE SET
+            {update_set}
+        WHERE {changed_condition}"""
+    else:
+        # Apenas colunas da PK: não há o que atualizar em linhas existentes
+        conflict_clause = "DO NOTHING"
+    
+    # Tabela temporária de staging: os dados são carregados em lote e
+    # mesclados na tabela principal com um único INSERT ... SELECT
+    stage_table = _quote_identifier(f"_stage_{table_name}")
+    
+    create_stage_sql = f"""
+        CREATE TEMP TABLE {stage_table} AS
+        SELECT {columns_str} FROM {table} WHERE 0
+    """
+    insert_stage_sql = f"INSERT INTO {stage_table} ({columns_str}) VALUES ({placeholders})"
+    
+    # "WHERE true" evita a ambiguidade de parsing entre SELECT e ON CONFLICT
+    merge_sql = f"""
+        INSERT INTO {table} ({columns_str}, created_at, updated_at)
+        SELECT {columns_str}, :now, :now
+        FROM {stage_table} WHERE true
+        ON CONFLICT({pk_constraint}) {conflict_clause}
+    """
+    drop_stage_sql = f"DROP TABLE IF EXISTS temp.{stage_table}"
+    
+    return create_stage_sql, insert_stage_sql, merge_sql, drop_stage_sql
 
 
 def upsert_rows(
-    df: pd.DataFrame,
+    df: 'pd.DataFrame',
     table_name: str = PNS_TABLE_NAME,
-    pk_columns: Optional[List[str]] = None
+    pk_columns: Optional[List[str]] = None,
+    chunksize: int = 10_000,
+    conn: Optional[sqlite3.Connection] = None
 ) -> None:
     """
     Insere ou atualiza linhas na tabela baseado na chave primária.
     
-    Usa INSERT ... ON CONFLICT DO UPDATE para fazer upsert, preservando
-    created_at quando a linha já existe (não atualiza created_at em updates).
+    Carrega as linhas em uma tabela temporária de staging e as mescla na
+    tabela principal com um único INSERT ... SELECT ... ON CONFLICT DO UPDATE,
+    preservando created_at quando a linha já existe (não atualiza created_at
+    em updates). Valores nulos no DataFrame não sobrescrevem valores existentes.
+    Linhas existentes sem nenhuma mudança (ou DataFrames apenas com a PK) não
+    são reescritas.
     
     Args:
         df: DataFrame com os dados a serem inseridos/atualizados
         table_name: Nome da tabela (padrão: PNS_TABLE_NAME)
         pk_columns: Lista de colunas que formam a chave primária
                    (padrão: PRIMARY_KEY_COLUMNS do config.py)
+        chunksize: Número de linhas enviadas por lote ao SQLite (padrão: 10.000)
+        conn: Conexão a reutilizar na transação de quem chamou (opcional)
     
     Raises:
-        ValueError: Se o DataFrame estiver vazio ou não contiver as colunas da PK
+        ValueError: Se o DataFrame estiver vazio, não contiver as colunas da PK,
+                    se chunksize for menor que 1 ou se table_name não for um
+                    identificador válido
     """
+    import pandas as pd
+    
+    _validate_table_name(table_name)
+    
     if df.empty:
         log.warning("DataFrame vazio, nada a inserir")
         return
     
+    if chunksize < 1:
+        raise ValueError(f"chunksize deve ser maior ou igual a 1: {chunksize}")
+    
     if pk_columns is None:
         pk_columns = PRIMARY_KEY_COLUMNS
     
@@ -229,54 +666,68 @@ def upsert_rows(
         raise ValueError(f"DataFrame não contém colunas da PK: {missing_pk}")
     
     # Garantir que todas as colunas do DataFrame existem na tabela
-    ensure_columns_exist(df.columns.tolist(), table_name)
+    ensure_columns_exist(df, table_name, conn=conn)
     
     # Colunas para inserção (excluir created_at e updated_at se não estiverem no DataFrame)
-    # created_at será preenchido automaticamente pelo DEFAULT na primeira inserção
-    # updated_at será atualizado sempre
+    # created_at e updated_at recebem o timestamp do lote na inserção
+    # updated_at é atualizado sempre que a linha muda
     columns_to_insert = [col for col in df.columns.tolist() 
                          if col not in ['created_at', 'updated_at']]
     
-    # Construir query com ON CONFLICT DO UPDATE
-    # SQLite 3.24+ suporta esta sintaxe
-    placeholders = ', '.join(['?' for _ in columns_to_insert])
-    columns_str = ', '.join(columns_to_insert)
+    df_subset = df[columns_to_insert]
     
-    # Colunas para atualizar (todas exceto PK, created_at e updated_at)
-    # created_at nunca é atualizado (preserva o valor original)
-    # updated_at sempre é atualizado para CURRENT_TIMESTAMP
-    update_columns = [col for col in columns_to_insert if col not in pk_columns]
-    update_parts = [f'{col} = excluded.{col}' for col in update_columns]
-    update_parts.append('updated_at = CURRENT_TIMESTAMP')
-    update_set = ', '.join(update_parts)
-    
-    # Valores para inserção
-    # Converter DataFrame para lista de tuplas, substituindo NaN por None
-    # Isso é necessário porque SQLite não suporta NAType do pandas
-    df_subset = df[columns_to_insert].copy()
-    
-    # Converter para lista de tuplas, substituindo todos os tipos de NaN por None
-    # SQLite aceita None como NULL, mas não aceita NAType do pandas
-    values = []
-    for _, row in df_subset.iterrows():
-        row_tuple = tuple(None if pd.isna(val) else val for val in row)
-        values.append(row_tuple)
-    
-    # Construir cláusula ON CONFLICT usando PRIMARY_KEY_COLUMNS
-    pk_constraint = ", ".join(PRIMARY_KEY_COLUMNS)
-    
-    query = f"""
-        INSERT INTO {table_name} ({columns_str}, created_at, updated_at)
-        VALUES ({placeholders}, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-        ON CONFLICT({pk_constraint}) DO UPDATE SET
-            {update_set}
-    """
+    create_stage_sql, insert_stage_sql, merge_sql, drop_stage_sql = _build_upsert_sql(
+        table_name, tuple(columns_to_insert), tuple(pk_columns)
+    )
     
-    with get_connection() as conn:
+    with _use_connection(conn, immediate=True) as conn:
         cursor = conn.cursor()
-        cursor.executemany(query, values)
-        rows_affected = cursor.rowcount
-        log.info(f"Inseridas/atualizadas {rows_affected} linhas em {table_name}")
+        cursor.execute(drop_stage_sql)
+        cursor.execute(create_stage_sql)
+        try:
+            # Carregar em blocos para limitar a memória usada na conversão
+            rows_staged = 0
+            for start in range(0, len(df_subset), chunksize):
+                chunk = df_subset.iloc[start:start + chunksize]
+                
+                # Substituir todos os tipos de NaN por None
+                # SQLite aceita None como NULL, mas não aceita NAType do pandas
+                # Apenas colunas com nulos, datas (pd.Timestamp não é aceito pelo
+                # sqlite3) ou dtypes nullable do pandas (que geram escalares numpy)
+                # são convertidas para object; as demais mantêm o dtype nativo e
+                # são lidas coluna a coluna por itertuples
+                has_nulls = chunk.isna().any()
+                columns_to_convert = [
+                    col for col in chunk.columns
+                    if has_nulls[col] or chunk[col].dtype.kind == 'M' or (
+                        pd.api.types.is_extension_array_dtype(chunk[col].dtype)
+                        and not pd.api.types.is_string_dtype(chunk[col].dtype)
+                    )
+                ]
+                if columns_to_convert:
+                    chunk = chunk.copy()
+                    for col in columns_to_convert:
+                        values = chunk[col]
+                        if values.dtype.kind == 'M':
+                            # Mesmo formato texto de CURRENT_TIMESTAMP
+                            values = values.dt.strftime('%Y-%m-%d %H:%M:%S')
+                        chunk[col] = values.astype(object).where(values.notna(), None)
+                
+                cursor.executemany(
+                    insert_stage_sql,
+                    chunk.itertuples(index=False, name=None)
+                )
+                rows_staged += cursor.rowcount
+            
+            # Timestamp único para o lote, no mesmo formato UTC de CURRENT_TIMESTAMP
+            now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+            cursor.execute(merge_sql, {"now": now})
+            rows_affected = cursor.rowcount
+        finally:
+            cursor.execute(drop_stage_sql)
+        log.info(
+            f"Inseridas/atualizadas {rows_affected} de {rows_staged} linhas em {table_name}"
+        )
 
 
 # --- Tabelas de Metadados ---
@@ -398,17 +849,19 @@ def upsert_metadata_mapping(
         log.debug(f"Mapeamento '{nome_semantico}' -> '{origem}' sincronizado em metadata_mapping")
 
 
-def get_metadata_variables() -> pd.DataFrame:
+def get_metadata_variables() -> 'pd.DataFrame':
     """
     Retorna todas as variáveis do catálogo de metadados.
     
     Returns:
         DataFrame com todas as variáveis e seus metadados
     """
+    import pandas as pd
+    
     # Garantir que as tabelas de metadados existem
     ensure_metadata_tables()
     
-    with get_connection() as conn:
+    with get_reader() as conn:
         df = pd.read_sql_query("""
             SELECT 
                 nome_semantico,
@@ -430,7 +883,7 @@ def get_metadata_variables() -> pd.DataFrame:
         return df
 
 
-def get_metadata_mapping(nome_semantico: Optional[str] = None) -> pd.DataFrame:
+def get_metadata_mapping(nome_semantico: Optional[str] = None) -> 'pd.DataFrame':
     """
     Retorna os mapeamentos de variáveis por origem.
     
@@ -440,6 +893,8 @@ def get_metadata_mapping(nome_semantico: Optional[str] = None) -> pd.DataFrame:
     Returns:
         DataFrame com os mapeamentos
     """
+    import pandas as pd
+    
     # Garantir que as tabelas de metadados existem
     ensure_metadata_tables()
     
@@ -459,7 +914,7 @@ def get_metadata_mapping(nome_semantico: Optional[str] = None) -> pd.DataFrame:
     
     query += " ORDER BY nome_semantico, origem"
     
-    with get_connection() as conn:
+    with get_reader() as conn:
         df = pd.read_sql_query(query, conn, params=params)
         
         # Converter labels_categorias de JSON para dicionário Python
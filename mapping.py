@@ -197,6 +197,32 @@ VAR_MAP = {
     },
 }
 
+# --- Índices pré-calculados ---
+# Construídos uma única vez na importação para que as funções auxiliares
+# façam apenas uma leitura de dicionário por chamada.
+# Entradas que não são dicionários (ex: "descricao") não são origens.
+
+_CODIGO: dict[tuple[str, str], Optional[str]] = {
+    (var, origem): info.get("codigo")
+    for var, var_info in VAR_MAP.items()
+    for origem, info in var_info.items()
+    if isinstance(info, dict)
+}
+
+_TIPO: dict[tuple[str, str], Optional[str]] = {
+    (var, origem): info.get("tipo")
+    for var, var_info in VAR_MAP.items()
+    for origem, info in var_info.items()
+    if isinstance(info, dict)
+}
+
+_VARS_BY_ORIGEM: dict[str, tuple[str, ...]] = {}
+for (_var, _origem), _codigo in _CODIGO.items():
+    if _codigo is not None:
+        _VARS_BY_ORIGEM[_origem] = _VARS_BY_ORIGEM.get(_origem, ()) + (_var,)
+del _var, _origem, _codigo
+
+
 # --- Funções auxiliares ---
 
 def get_codigo_fisico(variavel_semantica: str, origem: str) -> Optional[str]:
@@ -210,13 +236,7 @@ def get_codigo_fisico(variavel_semantica: str, origem: str) -> Optional[str]:
     Returns:
         Código físico (ex: "c006") ou None se não existir
     """
-    if variavel_semantica not in VAR_MAP:
-        return None
-    
-    if origem not in VAR_MAP[variavel_semantica]:
-        return None
-    
-    return VAR_MAP[variavel_semantica][origem].get("codigo")
+    return _CODIGO.get((variavel_semantica, origem))
 
 
 def get_tipo(variavel_semantica: str, origem: str) -> Optional[str]:
@@ -230,13 +250,7 @@ def get_tipo(variavel_semantica: str, origem: str) -> Optional[str]:
     Returns:
         Tipo da variável ("int", "string", "float") ou None
     """
-    if variavel_semantica not in VAR_MAP:
-        return None
-    
-    if origem not in VAR_MAP[variavel_semantica]:
-        return None
-    
-    return VAR_MAP[variavel_semantica][origem].get("tipo")
+    return _TIPO.get((variavel_semantica, origem))
 
 
 def variavel_existe(variavel_semantica: str, origem: str) -> bool:
@@ -250,8 +264,7 @@ def variavel_existe(variavel_semantica: str, origem: str) -> bool:
     Returns:
         True se a variável existe (codigo != None), False caso contrário
     """
-    codigo = get_codigo_fisico(variavel_semantica, origem)
-    return codigo is not None
+    return _CODIGO.get((variavel_semantica, origem)) is not None
 
 
 def listar_variaveis_disponiveis(origem: str = None) -> list[str]:
@@ -268,8 +281,4 @@ def listar_variaveis_disponiveis(origem: str = None) -> list[str]:
     if origem is None:
         return list(VAR_MAP.keys())
     
-    return [
-        var for var in VAR_MAP.keys()
-        if variavel_existe(var, origem)
-    ]
-
+    return list(_VARS_BY_ORIGEM.get(origem, ()))
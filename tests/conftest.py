@@ -0,0 +1,31 @@
+"""
+Configuração compartilhada dos testes.
+
+Os scripts de teste gravam no SQLite ao serem importados; para não alterar o
+repositório local versionado (data/pns_cache.sqlite), todos os testes usam um
+banco em diretório temporário.
+"""
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Adiciona raiz ao path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import config
+
+# Deve ser definido antes de qualquer import de dao.sqlite_client
+config.SQLITE_PATH = Path(tempfile.mkdtemp(prefix="pns_tests_")) / "pns_cache.sqlite"
+
+
+@pytest.fixture
+def sqlite_tmp(tmp_path, monkeypatch):
+    """Aponta o cliente SQLite para um banco novo e vazio durante o teste."""
+    from dao import sqlite_client
+
+    sqlite_client.close_connection()
+    monkeypatch.setattr(sqlite_client, "SQLITE_PATH", tmp_path / "pns_cache.sqlite")
+    yield sqlite_client
+    sqlite_client.close_connection()
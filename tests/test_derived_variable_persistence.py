@@ -13,13 +13,15 @@ import pandas as pd
 sys.path.append(str(Path(__file__).parent.parent))
 
 from service.pns_service import get_dataframe, register_derived_variable
-from dao.sqlite_client import get_connection, PNS_TABLE_NAME
+from dao.sqlite_client import get_connection, close_connection, PNS_TABLE_NAME
 from config import SQLITE_PATH
 import os
 
 
 def apagar_banco():
     """Remove o banco SQLite se existir."""
+    # Fechar a conexão reutilizada antes de apagar o arquivo
+    close_connection()
     if SQLITE_PATH.exists():
         print(f"🗑️  Removendo banco existente: {SQLITE_PATH}")
         os.remove(SQLITE_PATH)
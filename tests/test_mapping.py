@@ -0,0 +1,54 @@
+"""
+Testes das funções auxiliares de mapping.py.
+
+Os índices pré-calculados devem responder exatamente como uma leitura direta
+de VAR_MAP.
+"""
+import pytest
+
+from mapping import (
+    VAR_MAP,
+    get_codigo_fisico,
+    get_tipo,
+    variavel_existe,
+    listar_variaveis_disponiveis,
+)
+
+ORIGENS = ['2013', '2019']
+
+
+@pytest.mark.parametrize('origem', ORIGENS)
+def test_lookups_match_var_map(origem):
+    for var, var_info in VAR_MAP.items():
+        info = var_info.get(origem) or {}
+        assert get_codigo_fisico(var, origem) == info.get('codigo')
+        assert get_tipo(var, origem) == info.get('tipo')
+        assert variavel_existe(var, origem) is (info.get('codigo') is not None)
+
+
+@pytest.mark.parametrize('origem', ORIGENS)
+def test_listar_variaveis_por_origem(origem):
+    esperado = [
+        var for var, var_info in VAR_MAP.items()
+        if (var_info.get(origem) or {}).get('codigo') is not None
+    ]
+    assert listar_variaveis_disponiveis(origem) == esperado
+
+
+def test_listar_todas_variaveis():
+    assert listar_variaveis_disponiveis() == list(VAR_MAP.keys())
+
+
+def test_descricao_nao_e_origem():
+    var = next(v for v, info in VAR_MAP.items() if 'descricao' in info)
+
+    assert get_codigo_fisico(var, 'descricao') is None
+    assert not variavel_existe(var, 'descricao')
+    assert listar_variaveis_disponiveis('descricao') == []
+
+
+def test_variavel_ou_origem_inexistente():
+    assert get_codigo_fisico('nao_existe', '2019') is None
+    assert get_tipo('nao_existe', '2019') is None
+    assert not variavel_existe('sexo', '1900')
+    assert listar_variaveis_disponiveis('1900') == []
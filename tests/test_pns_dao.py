@@ -0,0 +1,23 @@
+"""
+Testes do PNSDAO que não dependem de acesso ao BigQuery.
+"""
+import pytest
+
+pytest.importorskip("basedosdados")
+
+from config import PNS_TABLE_NAME
+from dao import pns_dao
+from dao.sqlite_client import get_reader
+
+
+def test_ensure_data_creates_columns_with_var_map_types(sqlite_tmp, monkeypatch):
+    # Sem busca no BigQuery: apenas a criação prévia das colunas
+    monkeypatch.setattr(pns_dao.PNSDAO, "_check_if_needs_data", lambda self, variables, source: False)
+
+    pns_dao.PNSDAO().ensure_data(["idade", "peso_amostral", "sexo"], ["2019"])
+
+    with get_reader() as conn:
+        types = {row[1]: row[2] for row in conn.execute(f"PRAGMA table_info({PNS_TABLE_NAME})")}
+    assert types['idade'] == 'INTEGER'
+    assert types['peso_amostral'] == 'REAL'
+    assert types['sexo'] == 'TEXT'
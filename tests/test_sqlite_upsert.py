@@ -0,0 +1,194 @@
+"""
+Testes do upsert e da inferência de tipos do dao/sqlite_client.py.
+
+Os testes que acessam o banco usam um SQLite novo em diretório temporário
+(fixture sqlite_tmp).
+"""
+import logging
+
+import pandas as pd
+import pytest
+
+from config import PNS_TABLE_NAME
+from dao import sqlite_client as sc
+
+
+def _pk(n: int = 1) -> dict:
+    """Colunas da PK para n linhas distintas."""
+    return {
+        'origem': ['2019'] * n,
+        'id_upa': [f'UPA{i:03d}' for i in range(n)],
+        'id_domicilio': ['01'] * n,
+        'id_morador': ['01'] * n,
+    }
+
+
+def _fetch(sql: str, params: tuple = ()) -> list:
+    with sc.get_reader() as conn:
+        return [tuple(row) for row in conn.execute(sql, params)]
+
+
+def _set_updated_at(value: str) -> None:
+    with sc.get_connection() as conn:
+        conn.execute(f"UPDATE {PNS_TABLE_NAME} SET updated_at = ?", (value,))
+
+
+@pytest.mark.usefixtures('sqlite_tmp')
+def test_null_does_not_overwrite_existing_value():
+    sc.upsert_rows(pd.DataFrame({**_pk(), 'idade': [30], 'sexo': ['2']}))
+    sc.upsert_rows(pd.DataFrame({**_pk(), 'idade': [None], 'sexo': ['1']}))
+
+    assert _fetch(f"SELECT idade, sexo FROM {PNS_TABLE_NAME}") == [(30, '1')]
+
+
+@pytest.mark.usefixtures('sqlite_tmp')
+def test_unchanged_rows_are_not_rewritten(caplog):
+    df = pd.DataFrame({**_pk(2), 'idade': [30, 40]})
+    sc.upsert_rows(df)
+    _set_updated_at('2000-01-01 00:00:00')
+
+    with caplog.at_level(logging.INFO, logger=sc.log.name):
+        sc.upsert_rows(df)
+
+    assert "Inseridas/atualizadas 0 de 2 linhas" in caplog.text
+    assert _fetch(f"SELECT DISTINCT updated_at FROM {PNS_TABLE_NAME}") == [
+        ('2000-01-01 00:00:00',)
+    ]
+
+
+@pytest.mark.usefixtures('sqlite_tmp')
+def test_wide_frame_upserts_repeatedly():
+    # Mais colunas do que a profundidade máxima de expressão do SQLite (1000)
+    wide = {f'var_{i:04d}': [i] for i in range(1200)}
+    df = pd.DataFrame({**_pk(), **wide})
+    sc.upsert_rows(df)
+    _set_updated_at('2000-01-01 00:00:00')
+
+    sc.upsert_rows(df)
+    assert _fetch(f"SELECT updated_at FROM {PNS_TABLE_NAME}") == [('2000-01-01 00:00:00',)]
+
+    sc.upsert_rows(df.assign(var_1199=[-1]))
+    rows = _fetch(f"SELECT var_0000, var_1199, updated_at FROM {PNS_TABLE_NAME}")
+    assert rows[0][:2] == (0, -1) and rows[0][2] != '2000-01-01 00:00:00'
+
+
+@pytest.mark.usefixtures('sqlite_tmp')
+def test_changed_row_bumps_updated_at_only():
+    sc.upsert_rows(pd.DataFrame({**_pk(2), 'idade': [30, 40]}))
+    _set_updated_at('2000-01-01 00:00:00')
+    created_before = _fetch(f"SELECT created_at FROM {PNS_TABLE_NAME} ORDER BY id_upa")
+
+    sc.upsert_rows(pd.DataFrame({**_pk(2), 'idade': [31, 40]}))
+
+    rows = _fetch(
+        f"SELECT id_upa, idade, updated_at, created_at FROM {PNS_TABLE_NAME} ORDER BY id_upa"
+    )
+    assert rows[0][1] == 31 and rows[0][2] != '2000-01-01 00:00:00'
+    assert rows[1][1:3] == (40, '2000-01-01 00:00:00')
+    assert [(row[3],) for row in rows] == created_before
+
+
+@pytest.mark.usefixtures('sqlite_tmp')
+def test_pk_only_frame_inserts_without_updating():
+    sc.upsert_rows(pd.DataFrame({**_pk(1), 'idade': [30]}))
+    _set_updated_at('2000-01-01 00:00:00')
+
+    sc.upsert_rows(pd.DataFrame(_pk(2)))
+
+    rows = _fetch(f"SELECT id_upa, idade, updated_at FROM {PNS_TABLE_NAME} ORDER BY id_upa")
+    assert rows[0] == ('UPA000', 30, '2000-01-01 00:00:00')
+    assert rows[1][:2] == ('UPA001', None)
+
+
+@pytest.mark.usefixtures('sqlite_tmp')
+def test_column_types_inferred_from_dtype():
+    df = pd.DataFrame({
+        **_pk(2),
+        'col_int': [1, 2],
+        'col_float': [1.5, None],
+        'col_text': ['a', 'b'],
+        'col_bool': [True, False],
+        'col_nullable_int': pd.array([1, None], dtype='Int64'),
+        'col_data': pd.to_datetime(['2020-01-02 03:04:05', '2021-06-07 08:09:10']),
+    })
+    sc.upsert_rows(df)
+
+    types = {
+        name: col_type
+        for _, name, col_type, *_ in _fetch(f"PRAGMA table_info({PNS_TABLE_NAME})")
+    }
+    assert types['col_int'] == 'INTEGER'
+    assert types['col_float'] == 'REAL'
+    assert types['col_text'] == 'TEXT'
+    assert types['col_bool'] == 'INTEGER'
+    assert types['col_nullable_int'] == 'INTEGER'
+    assert types['col_data'] == 'DATETIME'
+
+
+def test_column_type_inferred_from_name_without_dtype():
+    assert sc._infer_column_type('idade') == 'INTEGER'
+    assert sc._infer_column_type('renda_per_capita') == 'REAL'
+    assert sc._infer_column_type('processado_at') == 'DATETIME'
+    assert sc._infer_column_type('sexo') == 'TEXT'
+
+
+@pytest.mark.usefixtures('sqlite_tmp')
+def test_values_round_trip_losslessly():
+    df = pd.DataFrame({
+        **_pk(3),
+        'peso': [0.1 + 0.2, 1 / 3, None],
+        'filhos': pd.array([2, None, 0], dtype='Int64'),
+        'col_data': pd.to_datetime(['2020-01-02 03:04:05', None, '1999-12-31 23:59:59']),
+        'sexo': ['1', None, '2'],
+    })
+    sc.upsert_rows(df)
+
+    rows = _fetch(
+        f"SELECT peso, filhos, typeof(filhos), col_data, sexo "
+        f"FROM {PNS_TABLE_NAME} ORDER BY id_upa"
+    )
+    assert rows == [
+        (0.1 + 0.2, 2, 'integer', '2020-01-02 03:04:05', '1'),
+        (1 / 3, None, 'null', None, None),
+        (None, 0, 'integer', '1999-12-31 23:59:59', '2'),
+    ]
+
+
+@pytest.mark.usefixtures('sqlite_tmp')
+def test_chunked_load_matches_single_batch():
+    df = pd.DataFrame({
+        **_pk(5),
+        'peso': [0.1 + 0.2, None, 2.5, 1e-17, 3.0],
+        'idade': pd.array([1, None, 3, 4, None], dtype='Int64'),
+    })
+    sql = f"SELECT origem, id_upa, peso, idade FROM {PNS_TABLE_NAME} ORDER BY id_upa"
+
+    sc.upsert_rows(df)
+    single_batch = _fetch(sql)
+    with sc.get_connection() as conn:
+        conn.execute(f"DELETE FROM {PNS_TABLE_NAME}")
+
+    sc.upsert_rows(df, chunksize=2)
+    assert _fetch(sql) == single_batch
+
+
+@pytest.mark.parametrize('chunksize', [0, -1])
+@pytest.mark.usefixtures('sqlite_tmp')
+def test_invalid_chunksize_raises(chunksize):
+    with pytest.raises(ValueError, match='chunksize'):
+        sc.upsert_rows(pd.DataFrame({**_pk(), 'idade': [30]}), chunksize=chunksize)
+
+    assert not sc.table_exists()
+
+
+@pytest.mark.parametrize('table_name', ['pns; DROP TABLE x', 'tabela-1', '1tabela', ''])
+def test_invalid_table_name_raises(table_name):
+    # A validação acontece antes de qualquer acesso ao banco
+    df = pd.DataFrame(_pk())
+
+    with pytest.raises(ValueError):
+        sc.upsert_rows(df, table_name=table_name)
+    with pytest.raises(ValueError):
+        sc.table_exists(table_name)
+    with pytest.raises(ValueError):
+        sc.ensure_table_exists(table_name)